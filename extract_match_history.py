@@ -6,46 +6,82 @@ Creates match_history.csv with individual match data.
 
 import re
 import csv
+import io
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Iterator, Optional, List, Tuple
 import sys
 import time
 
 
-def extract_server_name(html_content: str) -> Optional[str]:
+# Patterns are compiled once at import time rather than on every call. They
+# are bytes patterns: files are scanned undecoded and only captured groups
+# are decoded to str.
+_RE_TITLE = re.compile(rb'<title>\s*(.+?)\s*-\s*Ranked Among Us Leaderboards\s*</title>', re.IGNORECASE)
+_RE_SEASON = re.compile(rb'data-href="[^"]*tournament=([^"&]+)')
+_RE_SEASON_NUM = re.compile(rb'Season\s+(\d+)', re.IGNORECASE)
+_RE_DISCORD_AVATAR = re.compile(rb'cdn\.discordapp\.com/avatars/(\d+)/')
+_RE_USERNAME = re.compile(rb'class="avatar avatarTop"[^>]*>.*?<h1[^>]*>\s*([^<]+?)\s*</h1>', re.DOTALL)
+
+# Pattern for each row of the archiveResults table, matched on its own after
+# the table is split on <tr> so a malformed row cannot run into later rows:
+# <tr>
+#   <th>MATCH_ID</th>
+#   <td><img src="...polus.png"/></td>
+#   <td><img src="...steam_AboutCrew_v2.png"/></td>
+#   <td>WIN_PCT%</td>
+#   <td><span ...>Won/Loss</span></td>
+#   <td>+/-MMR (optional: % of total)</td>
+# </tr>
+_RE_ROW = re.compile(
+    rb'\s*<th[^>]*>\s*(\d+)\s*</th>\s*<td[^>]*>\s*<img[^>]*src="([^"]+)"[^>]*>\s*</td>\s*<td[^>]*>\s*<img[^>]*src="([^"]+)"[^>]*>\s*</td>\s*<td[^>]*>\s*([\d.]+)%\s*</td>\s*<td[^>]*>\s*<span[^>]*>\s*(Won|Loss)\s*</span>\s*</td>\s*<td[^>]*>\s*[+]?([-]?[\d.]+)(.*?)</td>',
+    re.DOTALL
+)
+_RE_PCT_TOTAL = re.compile(rb'([\d.]+)%\s*of\s*total')
+
+# Number of files handed to a worker process per task
+_CHUNKSIZE = 64
+
+# Output CSV buffer; one large buffer amortizes encoder and write() calls
+_CSV_BUFFER_SIZE = 1 << 20
+
+
+def extract_server_name(html_content: bytes) -> Optional[str]:
     """Extract server name from the HTML title."""
-    match = re.search(r'<title>\s*(.+?)\s*-\s*Ranked Among Us Leaderboards\s*</title>', html_content, re.IGNORECASE)
+    match = _RE_TITLE.search(html_content)
     if match:
-        return match.group(1).strip()
+        return match.group(1).decode('utf-8').strip()
     return None
 
 
-def extract_season(html_content: str) -> str:
+def extract_season(html_content: bytes) -> str:
     """Extract season/tournament from data-href attributes."""
-    match = re.search(r'data-href="[^"]*tournament=([^"&]+)', html_content)
+    match = _RE_SEASON.search(html_content)
     if match:
         season_str = match.group(1).strip()
-        season_num_match = re.search(r'Season\s+(\d+)', season_str, re.IGNORECASE)
+        season_num_match = _RE_SEASON_NUM.search(season_str)
         if season_num_match:
-            return season_num_match.group(1)
+            return season_num_match.group(1).decode('utf-8')
         else:
             return "0"
     return "0"
 
 
-def extract_discord_id(html_content: str) -> Optional[str]:
+def extract_discord_id(html_content: bytes) -> Optional[str]:
     """Extract player's Discord ID from avatar URL."""
-    match = re.search(r'cdn\.discordapp\.com/avatars/(\d+)/', html_content)
+    match = _RE_DISCORD_AVATAR.search(html_content)
     if match:
-        return match.group(1)
+        return match.group(1).decode('utf-8')
     return None
 
 
-def extract_username(html_content: str) -> Optional[str]:
+def extract_username(html_content: bytes) -> Optional[str]:
     """Extract player username from the header section."""
-    match = re.search(r'class="avatar avatarTop"[^>]*>.*?<h1[^>]*>\s*([^<]+?)\s*</h1>', html_content, re.DOTALL)
+    match = _RE_USERNAME.search(html_content)
     if match:
-        return match.group(1).strip()
+        return match.group(1).decode('utf-8').strip()
     return None
 
 
@@ -71,116 +107,137 @@ def extract_role_from_image(img_src: str) -> str:
     return 'Unknown'
 
 
-def extract_match_history(html_content: str) -> List[Dict[str, str]]:
-    """Extract recent 10 match results from the archiveResults table."""
-    matches = []
-    
-    # Find the "Recent 10 Results" table
-    table_match = re.search(
-        r'Recent 10 Results.*?<table[^>]*class="archiveResults[^"]*"[^>]*>(.*?)</table>',
-        html_content,
-        re.DOTALL | re.IGNORECASE
-    )
-    
-    if not table_match:
-        return matches
+def extract_match_history(html_content: bytes) -> Iterator[Tuple[Optional[str], ...]]:
+    """
+    Extract recent 10 match results from the archiveResults table.
     
-    table_content = table_match.group(1)
+    Yields tuples of: match_id, map, role, win_probability_pct, result,
+    mmr_change, mmr_pct_of_total
+    """
+    # Find the "Recent 10 Results" table. The table and its rows are located
+    # with plain substring searches, which run in C, instead of lazy DOTALL
+    # regexes that step through the document one character at a time.
+    heading = html_content.find(b'Recent 10 Results')
+    if heading < 0:
+        return
     
-    # Find all match rows
-    # Pattern for each row:
-    # <tr>
-    #   <th>MATCH_ID</th>
-    #   <td><img src="...polus.png"/></td>
-    #   <td><img src="...steam_AboutCrew_v2.png"/></td>
-    #   <td>WIN_PCT%</td>
-    #   <td><span ...>Won/Loss</span></td>
-    #   <td>+/-MMR (optional: % of total)</td>
-    # </tr>
+    table_class = html_content.find(b'class="archiveResults', heading)
+    if table_class < 0:
+        return
     
-    row_pattern = r'<tr>\s*<th[^>]*>\s*(\d+)\s*</th>\s*<td[^>]*>\s*<img[^>]*src="([^"]+)"[^>]*>\s*</td>\s*<td[^>]*>\s*<img[^>]*src="([^"]+)"[^>]*>\s*</td>\s*<td[^>]*>\s*([\d.]+)%\s*</td>\s*<td[^>]*>\s*<span[^>]*>\s*(Won|Loss)\s*</span>\s*</td>\s*<td[^>]*>\s*[+]?([-]?[\d.]+)(.*?)</td>'
+    table_start = html_content.find(b'>', table_class) + 1
+    table_end = html_content.find(b'</table>', table_start)
+    if table_start == 0 or table_end < 0:
+        return
     
-    row_matches = re.finditer(row_pattern, table_content, re.DOTALL)
+    table_content = html_content[table_start:table_end]
     
-    for match in row_matches:
-        match_id = match.group(1)
-        map_img = match.group(2)
-        role_img = match.group(3)
-        win_pct = match.group(4)
-        result = match.group(5)
-        mmr_change = match.group(6)
+    # Find all match rows; the header row has no match ID and is skipped
+    for row_content in table_content.split(b'<tr>')[1:]:
+        match = _RE_ROW.match(row_content)
+        if not match:
+            continue
+        
+        match_id = match.group(1).decode('utf-8')
+        map_img = match.group(2).decode('utf-8')
+        role_img = match.group(3).decode('utf-8')
+        win_pct = match.group(4).decode('utf-8')
+        result = match.group(5).decode('utf-8')
+        mmr_change = match.group(6).decode('utf-8')
         mmr_extra = match.group(7)
         
         # Extract % of total if present
         pct_of_total = None
-        pct_match = re.search(r'([\d.]+)%\s*of\s*total', mmr_extra)
+        pct_match = _RE_PCT_TOTAL.search(mmr_extra)
         if pct_match:
-            pct_of_total = pct_match.group(1)
-        
-        match_data = {
-            'match_id': match_id,
-            'map': extract_map_from_image(map_img),
-            'role': extract_role_from_image(role_img),
-            'win_probability_pct': win_pct,
-            'result': result,
-            'mmr_change': mmr_change,
-            'mmr_pct_of_total': pct_of_total
-        }
+            pct_of_total = pct_match.group(1).decode('utf-8')
         
-        matches.append(match_data)
-    
-    return matches
+        yield (
+            match_id,
+            extract_map_from_image(map_img),
+            extract_role_from_image(role_img),
+            win_pct,
+            result,
+            mmr_change,
+            pct_of_total,
+        )
 
 
-def extract_all_match_data(html_file: Path) -> List[Dict[str, str]]:
-    """Extract match history from an HTML file, returning one row per match."""
+def extract_all_match_data(html_file: str) -> List[Tuple[Optional[str], ...]]:
+    """Extract match history from an HTML file, returning one row per match in CSV column order."""
     try:
-        with open(html_file, 'r', encoding='utf-8') as f:
+        # Unbuffered: a whole-file read goes straight into one bytes object
+        with open(html_file, 'rb', buffering=0) as f:
             html_content = f.read()
         
         # Extract basic player info
-        server_name = extract_server_name(html_content)
-        season = extract_season(html_content)
         discord_id = extract_discord_id(html_content)
-        username = extract_username(html_content)
         
         if not discord_id:
-            print(f"Warning: Could not extract Discord ID from {html_file.name}")
+            print(f"Warning: Could not extract Discord ID from {os.path.basename(html_file)}")
             return []
         
-        # Extract matches
-        matches = extract_match_history(html_content)
+        # Pages without a match table produce no rows; a substring check is
+        # far cheaper than extracting the remaining header fields first
+        if b'class="archiveResults' not in html_content:
+            return []
         
-        # Build data rows - one per match
-        rows = []
-        for match in matches:
-            row = {
-                'server_name': server_name or 'Unknown',
-                'season': season,
-                'player_discord_id': discord_id,
-                'player_username': username or 'Unknown',
-            }
-            row.update(match)
-            rows.append(row)
+        server_name = extract_server_name(html_content)
+        season = extract_season(html_content)
+        username = extract_username(html_content)
         
-        return rows
+        # Build data rows - one per match. The player columns are the same for
+        # every match, so they are built once and shared by all rows
+        player = (server_name or 'Unknown', season, discord_id, username or 'Unknown')
+        return [player + match for match in extract_match_history(html_content)]
         
     except Exception as e:
-        print(f"Error processing {html_file.name}: {e}")
+        print(f"Error processing {os.path.basename(html_file)}: {e}")
         return []
 
 
+def format_match_data(html_file: str) -> Tuple[str, int]:
+    """Extract match history from an HTML file, returning its rows as CSV text and the row count."""
+    rows = extract_all_match_data(html_file)
+    buffer = io.StringIO(newline='')
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue(), len(rows)
+
+
+def iter_html_files(root: Path) -> Iterator[str]:
+    """Yield the paths of all HTML files under root, recursively."""
+    # os.scandir reports entry types from the directory listing itself, so
+    # the walk needs no per-file stat call or Path object
+    stack = [root]
+    while stack:
+        # Directories that cannot be read (or vanish mid-walk) are skipped,
+        # as glob does, rather than aborting the whole run
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.html'):
+                    yield entry.path
+
+
 def process_html_files(input_dir: Path, output_csv: Path):
     """Process all HTML files in the input directory and create CSV."""
     
-    # Get all HTML files recursively from all subdirectories
-    html_files = list(input_dir.glob('**/*.html'))
+    # Walk all subdirectories lazily so parsing starts while the walk is
+    # still running; peek at the first file to detect an empty input
+    html_files = iter_html_files(input_dir)
+    first_file = next(html_files, None)
     
-    if not html_files:
+    if first_file is None:
         print(f"No HTML files found in {input_dir}")
         return
     
-    print(f"Found {len(html_files)} HTML files to process...")
+    html_files = itertools.chain([first_file], html_files)
+    print(f"Processing HTML files from {input_dir}...")
     
     # CSV column headers
     fieldnames = [
@@ -197,41 +254,45 @@ def process_html_files(input_dir: Path, output_csv: Path):
         'mmr_pct_of_total',
     ]
     
-    # Process files and write to CSV
-    all_data = []
+    # Process files, writing each file's rows to the CSV as they arrive
     successful_files = 0
     total_matches = 0
     failed = 0
     
-    start_time = time.time()
+    # Elapsed times use the monotonic clock, which wall-clock adjustments
+    # cannot skew
+    start_time = time.monotonic()
     batch_start = start_time
     
-    for i, html_file in enumerate(html_files, 1):
-        if i % 100 == 0:
-            batch_time = time.time() - batch_start
-            elapsed = time.time() - start_time
-            print(f"Processing file {i}/{len(html_files)}... (last 100 took {batch_time:.1f}s, total elapsed: {elapsed/60:.1f}m, {total_matches} matches found)")
-            batch_start = time.time()
+    print(f"Writing match records to {output_csv}...")
+    with open(output_csv, 'w', newline='', encoding='utf-8', buffering=_CSV_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
         
-        rows = extract_all_match_data(html_file)
-        if rows:
-            all_data.extend(rows)
-            successful_files += 1
-            total_matches += len(rows)
-        elif rows is not None and len(rows) == 0:
-            # Successfully processed but no matches found
-            successful_files += 1
-        else:
-            failed += 1
-    
-    # Write to CSV
-    print(f"\nWriting {len(all_data)} match records to {output_csv}...")
-    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_data)
+        # Files are independent, so they are parsed across all cores; results
+        # come back in input order and progress is reported from this process.
+        # Workers format their own rows as CSV text, so this process only
+        # appends each file's text and keeps up with the workers instead of
+        # letting finished results pile up in memory
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = executor.map(format_match_data, html_files, chunksize=_CHUNKSIZE)
+            for i, (text, row_count) in enumerate(results, 1):
+                if row_count:
+                    f.write(text)
+                    successful_files += 1
+                    total_matches += row_count
+                else:
+                    # Successfully processed but no matches found
+                    successful_files += 1
+                
+                if i % 100 == 0:
+                    now = time.monotonic()
+                    batch_time = now - batch_start
+                    elapsed = now - start_time
+                    print(f"Processed {i} files... (last 100 took {batch_time:.1f}s, total elapsed: {elapsed/60:.1f}m, {total_matches} matches found)")
+                    batch_start = now
     
-    total_time = time.time() - start_time
+    total_time = time.monotonic() - start_time
     print(f"\n✓ Complete!")
     print(f"  Successfully processed: {successful_files} files")
     print(f"  Total match records: {total_matches}")
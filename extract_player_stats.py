@@ -6,64 +6,137 @@ Creates player_main_stats.csv with composite key: {discord_id, server_name, seas
 
 import re
 import csv
+import io
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, Optional, List, Match, Pattern, Tuple
 import sys
 import time
 
 
-def extract_server_name(html_content: str) -> Optional[str]:
+# Patterns are compiled once at import time rather than on every call. They
+# are bytes patterns: files are scanned undecoded and only captured groups
+# are decoded to str.
+_RE_TITLE = re.compile(rb'<title>\s*(.+?)\s*-\s*Ranked Among Us Leaderboards\s*</title>', re.IGNORECASE)
+_RE_SEASON = re.compile(rb'data-href="[^"]*tournament=([^"&]+)')
+_RE_SEASON_NUM = re.compile(rb'Season\s+(\d+)', re.IGNORECASE)
+_RE_DISCORD_AVATAR = re.compile(rb'cdn\.discordapp\.com/avatars/(\d+)/')
+_RE_DISCORD_HREF = re.compile(rb'data-href="[^"]*id=(\d+)')
+_RE_USERNAME = re.compile(rb'class="avatar avatarTop"[^>]*>.*?<h1[^>]*>\s*([^<]+?)\s*</h1>', re.DOTALL)
+
+# Role rows of the stats table: rank, mmr, games played %, wins, losses, win %
+_ROLE_CELLS = rb'\s*<td[^>]*>\s*(\d+)\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>'
+_RE_CREW = re.compile(rb'<tr>\s*<th[^>]*color:\s*royalblue[^>]*>.*?steam_AboutCrew.*?</th>' + _ROLE_CELLS, re.DOTALL)
+_RE_IMP = re.compile(rb'<th[^>]*color:\s*red[^>]*>.*?steam_AboutImpostor.*?</th>' + _ROLE_CELLS, re.DOTALL)
+_RE_COMBINED = re.compile(rb'<th[^>]*color:\s*white[^>]*>.*?</th>' + _ROLE_CELLS, re.DOTALL)
+_ROLE_PATTERNS = {
+    'Crewmate': _RE_CREW,  # blue/royalblue row
+    'Impostor': _RE_IMP,  # red row
+    'Combined': _RE_COMBINED,  # white/blueviolet row
+}
+
+# Number of files handed to a worker process per task
+_CHUNKSIZE = 64
+
+# Output CSV buffer; one large buffer amortizes encoder and write() calls
+_CSV_BUFFER_SIZE = 1 << 20
+
+# CSV column headers
+_FIELDNAMES = [
+    'server_name',
+    'season',
+    'discord_id',
+    'username',
+    'combined_rank',
+    'combined_mmr',
+    'combined_games_played_pct',
+    'combined_wins',
+    'combined_losses',
+    'combined_win_pct',
+    'crewmate_rank',
+    'crewmate_mmr',
+    'crewmate_games_played_pct',
+    'crewmate_wins',
+    'crewmate_losses',
+    'crewmate_win_pct',
+    'impostor_rank',
+    'impostor_mmr',
+    'impostor_games_played_pct',
+    'impostor_wins',
+    'impostor_losses',
+    'impostor_win_pct',
+]
+
+
+def _search_from(pattern: Pattern[bytes], html_content: bytes, pos: int) -> Tuple[Optional[Match[bytes]], int]:
+    """
+    Search for pattern starting at pos, falling back to the whole document.
+    
+    Returns the match (or None) and the position the next search should resume from.
+    """
+    match = pattern.search(html_content, pos)
+    if match is None and pos:
+        match = pattern.search(html_content)
+    if match is None:
+        return None, pos
+    return match, max(pos, match.end())
+
+
+def extract_server_name(html_content: bytes, pos: int = 0) -> Tuple[Optional[str], int]:
     """Extract server name from the HTML title."""
-    match = re.search(r'<title>\s*(.+?)\s*-\s*Ranked Among Us Leaderboards\s*</title>', html_content, re.IGNORECASE)
+    match, pos = _search_from(_RE_TITLE, html_content, pos)
     if match:
-        return match.group(1).strip()
-    return None
+        return match.group(1).decode('utf-8').strip(), pos
+    return None, pos
 
 
-def extract_season(html_content: str) -> str:
+def extract_season(html_content: bytes, pos: int = 0) -> Tuple[str, int]:
     """Extract season/tournament from data-href attributes."""
-    match = re.search(r'data-href="[^"]*tournament=([^"&]+)', html_content)
+    match, pos = _search_from(_RE_SEASON, html_content, pos)
     if match:
         season_str = match.group(1).strip()
         # Try to extract number from "Season X" format
-        season_num_match = re.search(r'Season\s+(\d+)', season_str, re.IGNORECASE)
+        season_num_match = _RE_SEASON_NUM.search(season_str)
         if season_num_match:
-            return season_num_match.group(1)
+            return season_num_match.group(1).decode('utf-8'), pos
         else:
-            return "0"  # No season number found
-    return "0"
+            return "0", pos  # No season number found
+    return "0", pos
 
 
-def extract_discord_id(html_content: str) -> Optional[str]:
+def extract_discord_id(html_content: bytes, pos: int = 0) -> Tuple[Optional[str], int]:
     """Extract player's Discord ID from avatar URL or data-href."""
     # Try from avatar URL first
-    match = re.search(r'cdn\.discordapp\.com/avatars/(\d+)/', html_content)
+    match, pos = _search_from(_RE_DISCORD_AVATAR, html_content, pos)
     if match:
-        return match.group(1)
+        return match.group(1).decode('utf-8'), pos
     
     # Try from data-href as backup
-    match = re.search(r'data-href="[^"]*id=(\d+)', html_content)
+    match, pos = _search_from(_RE_DISCORD_HREF, html_content, pos)
     if match:
-        return match.group(1)
+        return match.group(1).decode('utf-8'), pos
     
-    return None
+    return None, pos
 
 
-def extract_username(html_content: str) -> Optional[str]:
+def extract_username(html_content: bytes, pos: int = 0) -> Tuple[Optional[str], int]:
     """Extract player username from the header section."""
     # Look for the username in the h1 tag that comes after the avatar
     # The h1 has specific styling attributes and the username is inside
-    match = re.search(r'class="avatar avatarTop"[^>]*>.*?<h1[^>]*>\s*([^<]+?)\s*</h1>', html_content, re.DOTALL)
+    match, pos = _search_from(_RE_USERNAME, html_content, pos)
     if match:
-        return match.group(1).strip()
-    return None
+        return match.group(1).decode('utf-8').strip(), pos
+    return None, pos
 
 
-def extract_role_stats(html_content: str, role: str) -> Dict[str, Optional[str]]:
+def extract_role_stats(html_content: bytes, role: str, pos: int = 0) -> Tuple[Dict[str, Optional[str]], int]:
     """
     Extract stats for a specific role (Crewmate, Impostor, or Combined).
     
-    Returns dict with keys: rank, mmr, games_played_pct, wins, losses, win_pct
+    Returns dict with keys: rank, mmr, games_played_pct, wins, losses, win_pct,
+    and the position the next search should resume from.
     """
     stats = {
         'rank': None,
@@ -74,50 +147,56 @@ def extract_role_stats(html_content: str, role: str) -> Dict[str, Optional[str]]
         'win_pct': None
     }
     
-    if role == 'Crewmate':
-        # Look for the crewmate row (blue/royalblue)
-        pattern = r'<tr>\s*<th[^>]*color:\s*royalblue[^>]*>.*?steam_AboutCrew.*?</th>\s*<td[^>]*>\s*(\d+)\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>'
-    elif role == 'Impostor':
-        # Look for the impostor row (red)
-        pattern = r'<th[^>]*color:\s*red[^>]*>.*?steam_AboutImpostor.*?</th>\s*<td[^>]*>\s*(\d+)\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>'
-    elif role == 'Combined':
-        # Look for the combined row (white/blueviolet)
-        pattern = r'<th[^>]*color:\s*white[^>]*>.*?</th>\s*<td[^>]*>\s*(\d+)\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+).*?</td>\s*<td[^>]*>\s*(\d+)%\s*</td>'
-    else:
-        return stats
-    
-    match = re.search(pattern, html_content, re.DOTALL)
+    pattern = _ROLE_PATTERNS.get(role)
+    if pattern is None:
+        return stats, pos
+    
+    match, pos = _search_from(pattern, html_content, pos)
     if match:
-        stats['rank'] = match.group(1)
-        stats['mmr'] = match.group(2)
-        stats['games_played_pct'] = match.group(3)
-        stats['wins'] = match.group(4)
-        stats['losses'] = match.group(5)
-        stats['win_pct'] = match.group(6)
+        stats['rank'] = match.group(1).decode('utf-8')
+        stats['mmr'] = match.group(2).decode('utf-8')
+        stats['games_played_pct'] = match.group(3).decode('utf-8')
+        stats['wins'] = match.group(4).decode('utf-8')
+        stats['losses'] = match.group(5).decode('utf-8')
+        stats['win_pct'] = match.group(6).decode('utf-8')
     
-    return stats
+    return stats, pos
 
 
-def extract_player_data(html_file: Path) -> Optional[Dict[str, str]]:
+def extract_player_data(html_file: str) -> Optional[Dict[str, str]]:
     """Extract all player data from an HTML file."""
     try:
-        with open(html_file, 'r', encoding='utf-8') as f:
+        # Unbuffered: a whole-file read goes straight into one bytes object
+        with open(html_file, 'rb', buffering=0) as f:
             html_content = f.read()
         
-        # Extract basic info
-        server_name = extract_server_name(html_content)
-        season = extract_season(html_content)
-        discord_id = extract_discord_id(html_content)
-        username = extract_username(html_content)
+        # Fields are searched in the order they appear on the page (title,
+        # avatar header, stats table, teammate links), each search resuming
+        # where the previous one ended, so the document is walked once.
+        # The avatar URL sits inside the header tag matched for the username,
+        # so the Discord ID search does not advance the position.
+        server_name, pos = extract_server_name(html_content)
+        discord_id, _ = extract_discord_id(html_content, pos)
         
         if not discord_id:
-            print(f"Warning: Could not extract Discord ID from {html_file.name}")
+            print(f"Warning: Could not extract Discord ID from {os.path.basename(html_file)}")
             return None
         
-        # Extract role-specific stats
-        combined_stats = extract_role_stats(html_content, 'Combined')
-        crew_stats = extract_role_stats(html_content, 'Crewmate')
-        imp_stats = extract_role_stats(html_content, 'Impostor')
+        username, pos = extract_username(html_content, pos)
+        
+        # Extract role-specific stats. All three rows live in the matchResults
+        # table, so they are searched within that slice of the page only
+        table_start = html_content.find(b'class="matchResults', pos)
+        table_end = html_content.find(b'</table>', table_start) if table_start >= 0 else -1
+        if table_end < 0:
+            table_start, table_end = pos, len(html_content)
+        stats_table = html_content[table_start:table_end]
+        
+        crew_stats, table_pos = extract_role_stats(stats_table, 'Crewmate')
+        imp_stats, table_pos = extract_role_stats(stats_table, 'Impostor', table_pos)
+        combined_stats, table_pos = extract_role_stats(stats_table, 'Combined', table_pos)
+        
+        season, pos = extract_season(html_content, table_start + table_pos)
         
         # Build the data row
         data = {
@@ -148,78 +227,91 @@ def extract_player_data(html_file: Path) -> Optional[Dict[str, str]]:
         return data
         
     except Exception as e:
-        print(f"Error processing {html_file.name}: {e}")
+        print(f"Error processing {os.path.basename(html_file)}: {e}")
+        return None
+
+
+def format_player_data(html_file: str) -> Optional[str]:
+    """Extract player data from an HTML file, returning its record as CSV text."""
+    data = extract_player_data(html_file)
+    if not data:
         return None
+    buffer = io.StringIO(newline='')
+    csv.DictWriter(buffer, fieldnames=_FIELDNAMES).writerow(data)
+    return buffer.getvalue()
+
+
+def iter_html_files(root: Path) -> Iterator[str]:
+    """Yield the paths of all HTML files under root, recursively."""
+    # os.scandir reports entry types from the directory listing itself, so
+    # the walk needs no per-file stat call or Path object
+    stack = [root]
+    while stack:
+        # Directories that cannot be read (or vanish mid-walk) are skipped,
+        # as glob does, rather than aborting the whole run
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.html'):
+                    yield entry.path
 
 
 def process_html_files(input_dir: Path, output_csv: Path):
     """Process all HTML files in the input directory and create CSV."""
     
-    # Get all HTML files recursively from all subdirectories
-    html_files = list(input_dir.glob('**/*.html'))
+    # Walk all subdirectories lazily so parsing starts while the walk is
+    # still running; peek at the first file to detect an empty input
+    html_files = iter_html_files(input_dir)
+    first_file = next(html_files, None)
     
-    if not html_files:
+    if first_file is None:
         print(f"No HTML files found in {input_dir}")
         return
     
-    print(f"Found {len(html_files)} HTML files to process...")
-    
-    # CSV column headers
-    fieldnames = [
-        'server_name',
-        'season',
-        'discord_id',
-        'username',
-        'combined_rank',
-        'combined_mmr',
-        'combined_games_played_pct',
-        'combined_wins',
-        'combined_losses',
-        'combined_win_pct',
-        'crewmate_rank',
-        'crewmate_mmr',
-        'crewmate_games_played_pct',
-        'crewmate_wins',
-        'crewmate_losses',
-        'crewmate_win_pct',
-        'impostor_rank',
-        'impostor_mmr',
-        'impostor_games_played_pct',
-        'impostor_wins',
-        'impostor_losses',
-        'impostor_win_pct',
-    ]
-    
-    # Process files and write to CSV
-    all_data = []
+    html_files = itertools.chain([first_file], html_files)
+    print(f"Processing HTML files from {input_dir}...")
+    
+    # Process files, writing each record to the CSV as it arrives
     successful = 0
     failed = 0
     
-    start_time = time.time()
+    # Elapsed times use the monotonic clock, which wall-clock adjustments
+    # cannot skew
+    start_time = time.monotonic()
     batch_start = start_time
     
-    for i, html_file in enumerate(html_files, 1):
-        if i % 100 == 0:
-            batch_time = time.time() - batch_start
-            elapsed = time.time() - start_time
-            print(f"Processing file {i}/{len(html_files)}... (last 100 took {batch_time:.1f}s, total elapsed: {elapsed/60:.1f}m)")
-            batch_start = time.time()
-        
-        data = extract_player_data(html_file)
-        if data:
-            all_data.append(data)
-            successful += 1
-        else:
-            failed += 1
-    
-    # Write to CSV
-    print(f"\nWriting {len(all_data)} records to {output_csv}...")
-    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+    print(f"Writing records to {output_csv}...")
+    with open(output_csv, 'w', newline='', encoding='utf-8', buffering=_CSV_BUFFER_SIZE) as f:
+        writer = csv.DictWriter(f, fieldnames=_FIELDNAMES)
         writer.writeheader()
-        writer.writerows(all_data)
+        
+        # Files are independent, so they are parsed across all cores; results
+        # come back in input order and progress is reported from this process.
+        # Workers format their own records as CSV text, so this process only
+        # appends each file's text and keeps up with the workers instead of
+        # letting finished results pile up in memory
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = executor.map(format_player_data, html_files, chunksize=_CHUNKSIZE)
+            for i, text in enumerate(results, 1):
+                if text:
+                    f.write(text)
+                    successful += 1
+                else:
+                    failed += 1
+                
+                if i % 100 == 0:
+                    now = time.monotonic()
+                    batch_time = now - batch_start
+                    elapsed = now - start_time
+                    print(f"Processed {i} files... (last 100 took {batch_time:.1f}s, total elapsed: {elapsed/60:.1f}m)")
+                    batch_start = now
     
-    total_time = time.time() - start_time
+    total_time = time.monotonic() - start_time
     print(f"\n✓ Complete!")
     print(f"  Successfully processed: {successful} files")
     print(f"  Failed: {failed} files")
@@ -6,139 +6,248 @@ Creates common_teammates.csv with teammate relationships.
 
 import re
 import csv
+import io
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Iterator, Optional, List, Match, Pattern, Tuple
 import sys
 import time
 
 
-def extract_server_name(html_content: str) -> Optional[str]:
+# Patterns are compiled once at import time rather than on every call. They
+# are bytes patterns: files are scanned undecoded and only captured groups
+# are decoded to str.
+_RE_TITLE = re.compile(rb'<title>\s*(.+?)\s*-\s*Ranked Among Us Leaderboards\s*</title>', re.IGNORECASE)
+_RE_SEASON = re.compile(rb'data-href="[^"]*tournament=([^"&]+)')
+_RE_SEASON_NUM = re.compile(rb'Season\s+(\d+)', re.IGNORECASE)
+# The avatar URL prefix is a fixed literal, so it is located with a plain
+# substring search and only the ID digits after it go through the regex engine
+_DISCORD_AVATAR_PREFIX = b'cdn.discordapp.com/avatars/'
+_RE_DISCORD_ID = re.compile(rb'(\d+)/')
+# The username heading follows the avatarTop image; both are located with
+# substring searches so no DOTALL pattern has to step across the header markup
+_AVATAR_TOP = b'class="avatar avatarTop"'
+_RE_USERNAME = re.compile(rb'<h1[^>]*>\s*([^<]+?)\s*</h1>')
+
+# Pattern for each row of the teammates table, matched on its own after the
+# table is split on <tr so no part of the pattern can run into later rows.
+# MMR can be negative.
+# <tr class="clickable-row" data-href="./?tournament=Season 1&id=DISCORD_ID">
+#   <th>RANK</th>
+#   <td><img .../> USERNAME</td>
+#   <td>MMR</td>
+#   <td>MATCHES [%]</td>
+_RE_ROW = re.compile(
+    rb'[^>]*data-href="[^"]*id=(\d+)"[^>]*>\s*<th[^>]*>\s*(\d+)\s*</th>\s*<td[^>]*>\s*<img[^>]*/>([^<]+)</td>\s*<td[^>]*>\s*(-?\d+)\s*</td>\s*<td[^>]*>\s*(\d+)\s*\[(\d+)%\]\s*</td>'
+)
+
+# Number of files handed to a worker process per task
+_CHUNKSIZE = 64
+
+# Output CSV buffer; one large buffer amortizes encoder and write() calls
+_CSV_BUFFER_SIZE = 1 << 20
+
+
+def _search_from(pattern: Pattern[bytes], html_content: bytes, pos: int) -> Tuple[Optional[Match[bytes]], int]:
+    """
+    Search for pattern starting at pos, falling back to the whole document.
+    
+    Returns the match (or None) and the position the next search should resume from.
+    """
+    match = pattern.search(html_content, pos)
+    if match is None and pos:
+        match = pattern.search(html_content)
+    if match is None:
+        return None, pos
+    return match, max(pos, match.end())
+
+
+def extract_server_name(html_content: bytes, pos: int = 0) -> Tuple[Optional[str], int]:
     """Extract server name from the HTML title."""
-    match = re.search(r'<title>\s*(.+?)\s*-\s*Ranked Among Us Leaderboards\s*</title>', html_content, re.IGNORECASE)
+    match, pos = _search_from(_RE_TITLE, html_content, pos)
     if match:
-        return match.group(1).strip()
-    return None
+        return match.group(1).decode('utf-8').strip(), pos
+    return None, pos
 
 
-def extract_season(html_content: str) -> str:
+def extract_season(html_content: bytes, pos: int = 0) -> Tuple[str, int]:
     """Extract season/tournament from data-href attributes."""
-    match = re.search(r'data-href="[^"]*tournament=([^"&]+)', html_content)
+    match, pos = _search_from(_RE_SEASON, html_content, pos)
     if match:
         season_str = match.group(1).strip()
-        season_num_match = re.search(r'Season\s+(\d+)', season_str, re.IGNORECASE)
+        season_num_match = _RE_SEASON_NUM.search(season_str)
         if season_num_match:
-            return season_num_match.group(1)
+            return season_num_match.group(1).decode('utf-8'), pos
         else:
-            return "0"
-    return "0"
+            return "0", pos
+    return "0", pos
+
+
+def _find_discord_id(html_content: bytes, pos: int) -> Optional[Match[bytes]]:
+    """Find the first avatar URL at or after pos whose prefix is followed by an ID."""
+    start = html_content.find(_DISCORD_AVATAR_PREFIX, pos)
+    while start >= 0:
+        match = _RE_DISCORD_ID.match(html_content, start + len(_DISCORD_AVATAR_PREFIX))
+        if match:
+            return match
+        start = html_content.find(_DISCORD_AVATAR_PREFIX, start + 1)
+    return None
 
 
-def extract_discord_id(html_content: str) -> Optional[str]:
+def extract_discord_id(html_content: bytes, pos: int = 0) -> Tuple[Optional[str], int]:
     """Extract player's Discord ID from avatar URL."""
-    match = re.search(r'cdn\.discordapp\.com/avatars/(\d+)/', html_content)
+    match = _find_discord_id(html_content, pos)
+    if match is None and pos:
+        match = _find_discord_id(html_content, 0)
     if match:
-        return match.group(1)
+        return match.group(1).decode('utf-8'), max(pos, match.end())
+    return None, pos
+
+
+def _find_username(html_content: bytes, pos: int) -> Optional[Match[bytes]]:
+    """Find the first username heading after the avatarTop image at or after pos."""
+    start = html_content.find(_AVATAR_TOP, pos)
+    if start < 0:
+        return None
+    heading = html_content.find(b'<h1', start + len(_AVATAR_TOP))
+    while heading >= 0:
+        match = _RE_USERNAME.match(html_content, heading)
+        if match:
+            return match
+        heading = html_content.find(b'<h1', heading + 1)
     return None
 
 
-def extract_username(html_content: str) -> Optional[str]:
+def extract_username(html_content: bytes, pos: int = 0) -> Tuple[Optional[str], int]:
     """Extract player username from the header section."""
-    match = re.search(r'class="avatar avatarTop"[^>]*>.*?<h1[^>]*>\s*([^<]+?)\s*</h1>', html_content, re.DOTALL)
+    match = _find_username(html_content, pos)
+    if match is None and pos:
+        match = _find_username(html_content, 0)
     if match:
-        return match.group(1).strip()
-    return None
+        return match.group(1).decode('utf-8').strip(), max(pos, match.end())
+    return None, pos
 
 
-def extract_teammates(html_content: str) -> List[Dict[str, str]]:
-    """Extract top 10 common teammates data."""
-    teammates = []
+def extract_teammates(html_content: bytes) -> Iterator[Tuple[str, ...]]:
+    """
+    Extract top 10 common teammates data.
     
-    # Find the "Top 10 Common Teammates" section
-    teammates_section = re.search(
-        r'Top 10 Common Teammates.*?<table.*?>(.*?)</table>',
-        html_content,
-        re.DOTALL | re.IGNORECASE
-    )
-    
-    if not teammates_section:
-        return teammates
-    
-    table_content = teammates_section.group(1)
-    
-    # Find all teammate rows
-    # Pattern: <tr class="clickable-row" data-href="./?tournament=Season 1&id=DISCORD_ID">
-    #   <th>RANK</th>
-    #   <td><img .../> USERNAME</td>
-    #   <td>MMR</td>
-    #   <td>MATCHES [%]</td>
+    Yields tuples of: teammate_rank, teammate_discord_id, teammate_username,
+    teammate_mmr, matches_together_count, matches_together_pct
+    """
+    # Find the "Top 10 Common Teammates" table. The table is located with
+    # plain substring searches, which run in C, instead of a lazy DOTALL
+    # regex that steps through the document one character at a time.
+    heading = html_content.find(b'Top 10 Common Teammates')
+    if heading < 0:
+        return
     
-    row_pattern = r'<tr[^>]*data-href="[^"]*id=(\d+)"[^>]*>.*?<th[^>]*>\s*(\d+)\s*</th>.*?<img[^>]*/>([^<]+)</td>.*?<td[^>]*>\s*(\d+)\s*</td>.*?<td[^>]*>\s*(\d+)\s*\[(\d+)%\]\s*</td>'
+    table_tag = html_content.find(b'<table', heading)
+    if table_tag < 0:
+        return
     
-    matches = re.finditer(row_pattern, table_content, re.DOTALL)
+    table_start = html_content.find(b'>', table_tag) + 1
+    table_end = html_content.find(b'</table>', table_start)
+    if table_start == 0 or table_end < 0:
+        return
     
-    for match in matches:
-        teammate = {
-            'teammate_discord_id': match.group(1),
-            'teammate_rank': match.group(2),
-            'teammate_username': match.group(3).strip(),
-            'teammate_mmr': match.group(4),
-            'matches_together_count': match.group(5),
-            'matches_together_pct': match.group(6)
-        }
-        teammates.append(teammate)
+    table_content = html_content[table_start:table_end]
     
-    return teammates
+    # Find all teammate rows; the header row has no data-href and is skipped
+    for row_content in table_content.split(b'<tr')[1:]:
+        match = _RE_ROW.match(row_content)
+        if not match:
+            continue
+        
+        discord_id, rank, username, mmr, count, pct = (group.decode('utf-8') for group in match.groups())
+        yield (rank, discord_id, username.strip(), mmr, count, pct)
 
 
-def extract_all_teammate_data(html_file: Path) -> List[Dict[str, str]]:
-    """Extract teammate data from an HTML file, returning one row per teammate."""
+def extract_all_teammate_data(html_file: str) -> List[Tuple[str, ...]]:
+    """Extract teammate data from an HTML file, returning one row per teammate in CSV column order."""
     try:
-        with open(html_file, 'r', encoding='utf-8') as f:
+        # Unbuffered: a whole-file read goes straight into one bytes object
+        with open(html_file, 'rb', buffering=0) as f:
             html_content = f.read()
         
-        # Extract basic player info
-        server_name = extract_server_name(html_content)
-        season = extract_season(html_content)
-        discord_id = extract_discord_id(html_content)
-        username = extract_username(html_content)
+        # Extract basic player info. Fields are searched in the order they
+        # appear on the page (title, avatar header, teammate links), each
+        # search resuming where the previous one ended, so the document is
+        # walked once. The avatar URL sits inside the header tag matched for
+        # the username, so the Discord ID search does not advance the position.
+        server_name, pos = extract_server_name(html_content)
+        discord_id, _ = extract_discord_id(html_content, pos)
         
         if not discord_id:
-            print(f"Warning: Could not extract Discord ID from {html_file.name}")
+            print(f"Warning: Could not extract Discord ID from {os.path.basename(html_file)}")
             return []
         
-        # Extract teammates
-        teammates = extract_teammates(html_content)
+        # Pages without a teammates table produce no rows; a substring check
+        # is far cheaper than extracting the remaining header fields first
+        if b'Top 10 Common Teammates' not in html_content:
+            return []
         
-        # Build data rows - one per teammate
-        rows = []
-        for teammate in teammates:
-            row = {
-                'server_name': server_name or 'Unknown',
-                'season': season,
-                'player_discord_id': discord_id,
-                'player_username': username or 'Unknown',
-            }
-            row.update(teammate)
-            rows.append(row)
+        username, pos = extract_username(html_content, pos)
         
-        return rows
+        # The season is read from the teammate links, so its search starts at
+        # the teammates heading instead of scanning the stats tables before it
+        heading = html_content.find(b'Top 10 Common Teammates', pos)
+        season, pos = extract_season(html_content, max(pos, heading))
+        
+        # Build data rows - one per teammate. The player columns are the same
+        # for every teammate, so they are built once and shared by all rows
+        player = (server_name or 'Unknown', season, discord_id, username or 'Unknown')
+        return [player + teammate for teammate in extract_teammates(html_content)]
         
     except Exception as e:
-        print(f"Error processing {html_file.name}: {e}")
+        print(f"Error processing {os.path.basename(html_file)}: {e}")
         return []
 
 
+def format_teammate_data(html_file: str) -> Tuple[str, int]:
+    """Extract teammate data from an HTML file, returning its rows as CSV text and the row count."""
+    rows = extract_all_teammate_data(html_file)
+    buffer = io.StringIO(newline='')
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue(), len(rows)
+
+
+def iter_html_files(root: Path) -> Iterator[str]:
+    """Yield the paths of all HTML files under root, recursively."""
+    # os.scandir reports entry types from the directory listing itself, so
+    # the walk needs no per-file stat call or Path object
+    stack = [root]
+    while stack:
+        # Directories that cannot be read (or vanish mid-walk) are skipped,
+        # as glob does, rather than aborting the whole run
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.html'):
+                    yield entry.path
+
+
 def process_html_files(input_dir: Path, output_csv: Path):
     """Process all HTML files in the input directory and create CSV."""
     
-    # Get all HTML files recursively from all subdirectories
-    html_files = list(input_dir.glob('**/*.html'))
+    # Walk all subdirectories lazily so parsing starts while the walk is
+    # still running; peek at the first file to detect an empty input
+    html_files = iter_html_files(input_dir)
+    first_file = next(html_files, None)
     
-    if not html_files:
+    if first_file is None:
         print(f"No HTML files found in {input_dir}")
         return
     
-    print(f"Found {len(html_files)} HTML files to process...")
+    html_files = itertools.chain([first_file], html_files)
+    print(f"Processing HTML files from {input_dir}...")
     
     # CSV column headers
     fieldnames = [
@@ -154,41 +263,44 @@ def process_html_files(input_dir: Path, output_csv: Path):
         'matches_together_pct',
     ]
     
-    # Process files and write to CSV
-    all_data = []
+    # Process files, writing each file's rows to the CSV as they arrive
     successful_files = 0
     total_teammates = 0
     failed = 0
     
-    start_time = time.time()
+    # Elapsed times use the monotonic clock, which wall-clock adjustments
+    # cannot skew
+    start_time = time.monotonic()
     batch_start = start_time
     
-    for i, html_file in enumerate(html_files, 1):
-        if i % 100 == 0:
-            batch_time = time.time() - batch_start
-            elapsed = time.time() - start_time
-            print(f"Processing file {i}/{len(html_files)}... (last 100 took {batch_time:.1f}s, total elapsed: {elapsed/60:.1f}m, {total_teammates} teammate relationships found)")
-            batch_start = time.time()
+    print(f"Writing teammate relationships to {output_csv}...")
+    with open(output_csv, 'w', newline='', encoding='utf-8', buffering=_CSV_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
         
-        rows = extract_all_teammate_data(html_file)
-        if rows:
-            all_data.extend(rows)
-            successful_files += 1
-            total_teammates += len(rows)
-        elif rows is not None and len(rows) == 0:
-            # Successfully processed but no teammates found
-            successful_files += 1
-        else:
-            failed += 1
-    
-    # Write to CSV
-    print(f"\nWriting {len(all_data)} teammate relationships to {output_csv}...")
-    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_data)
+        # Files are independent, so they are parsed across all cores; results
+        # come back in input order and progress is reported from this process.
+        # Workers format their own rows as CSV text, so this process only
+        # appends each file's text and does not become the bottleneck
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = executor.map(format_teammate_data, html_files, chunksize=_CHUNKSIZE)
+            for i, (text, row_count) in enumerate(results, 1):
+                if row_count:
+                    f.write(text)
+                    successful_files += 1
+                    total_teammates += row_count
+                else:
+                    # Successfully processed but no teammates found
+                    successful_files += 1
+                
+                if i % 100 == 0:
+                    now = time.monotonic()
+                    batch_time = now - batch_start
+                    elapsed = now - start_time
+                    print(f"Processed {i} files... (last 100 took {batch_time:.1f}s, total elapsed: {elapsed/60:.1f}m, {total_teammates} teammate relationships found)")
+                    batch_start = now
     
-    total_time = time.time() - start_time
+    total_time = time.monotonic() - start_time
     print(f"\n✓ Complete!")
     print(f"  Successfully processed: {successful_files} files")
     print(f"  Total teammate relationships: {total_teammates}")